@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Dict
 from .usrsys.maildir import MailDirectory
 from .mailstore import MailStore
 from .usrsys.storage import ProfileRecordStorage, UserRecordStorage
@@ -9,29 +10,47 @@ from .utils.storage import CommonStorage, UnQLiteStorage
 class StorageHub(object):
     """All storages about mailboat
     """
+    __slots__ = (
+        "database",
+        "_common_storages",
+        "_mail_directories",
+        "user_records",
+        "profile_records",
+        "mailstore",
+    )
+
     def __init__(self, database: UnQLite) -> None:
         self.database = database
+        self._common_storages: Dict[str, UnQLiteStorage] = {}
+        self._mail_directories: Dict[str, MailDirectory] = {}
+        self.user_records = UserRecordStorage(self.get_common_storage("users"))
+        self.profile_records = ProfileRecordStorage(
+            self.get_common_storage("profiles")
+        )
+        self.mailstore = MailStore(self.get_common_storage("mails"))
         super().__init__()
 
-    def get_common_storage(self, name: str) -> CommonStorage:
-        return UnQLiteStorage(self.database, name)
-
-    @property
-    def user_records(self) -> UserRecordStorage:
-        return UserRecordStorage(self.get_common_storage("users"))
+    def transaction(self):
+        """Get a context manager which batches every write inside it into one
+        database transaction, so they are committed with a single fsync.
+        """
+        return self.database.transaction()
 
-    @property
-    def profile_records(self) -> ProfileRecordStorage:
-        return ProfileRecordStorage(self.get_common_storage("profiles"))
-
-    @property
-    def mailstore(self) -> MailStore:
-        return MailStore(self.get_common_storage("mails"))
+    def get_common_storage(self, name: str) -> CommonStorage:
+        storage = self._common_storages.get(name)
+        if not storage:
+            storage = UnQLiteStorage(self.database, name)
+            self._common_storages[name] = storage
+        return storage
 
     def get_mail_directory(self, boxid: str) -> MailDirectory:
-        return MailDirectory(
-            self.get_common_storage("mailbox.{}".format(boxid)), self.mailstore
-        )
+        directory = self._mail_directories.get(boxid)
+        if not directory:
+            directory = MailDirectory(
+                self.get_common_storage(f"mailbox.{boxid}"), self.mailstore
+            )
+            self._mail_directories[boxid] = directory
+        return directory
 
 
 @dataclass
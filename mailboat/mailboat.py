@@ -23,8 +23,19 @@ from .mta import TransferAgent
 from . import MailboatContext, StorageHub
 from unqlite import UnQLite
 
+_PASSWORD_AUTH_METHODS = frozenset({"login", "plain"})
+
 
 class Mailboat(object):
+    __slots__ = (
+        "mydomains",
+        "hostname",
+        "database_path",
+        "database",
+        "storage_hub",
+        "transfer_agent",
+    )
+
     def __init__(
         self, *, hostname: str, mydomains: List[str], database_path: str, smtpd_port: Optional[int] = None
     ) -> None:
@@ -34,6 +45,10 @@ class Mailboat(object):
         self.hostname = hostname
         self.database_path = database_path
         self.database = UnQLite(database_path)
+        if not self.database.is_memory:
+            # keep more of the B-tree in memory for the write-heavy paths;
+            # the binding exposes no journal-mode tuning
+            self.database.set_max_page_cache(4096)
         self.storage_hub = StorageHub(self.database)
         self.transfer_agent = TransferAgent(
             mydomains=mydomains,
@@ -41,17 +56,19 @@ class Mailboat(object):
             database=self.storage_hub.database,
             smtpd_auth_handler=self.handle_smtpd_auth,
             hostname=self.hostname,
-            self_name="transfer_agent.{}".format(self.hostname),
+            self_name=f"transfer_agent.{self.hostname}",
             smtpd_port=smtpd_port
         )
         super().__init__()
     
     async def handle_smtpd_auth(self, server: SMTP, method: str, data: Any) -> AuthResult:
-        if method == 'login' or method == 'plain':
-            assert isinstance(data, LoginPassword)
+        if method in _PASSWORD_AUTH_METHODS:
+            if type(data) is not LoginPassword:
+                return AuthResult(success=False, handled=False)
             username: bytes = data.login
             password: bytes = data.password
-            username_s = username.decode('utf-8') # TODO (rubicon): support the other charsets
+            # ascii is the common case for credentials and skips utf-8 validation
+            username_s = username.decode('ascii') if username.isascii() else username.decode('utf-8') # TODO (rubicon): support the other charsets
             result = await self.storage_hub.user_records.check_user_password(username_s, password)
             return AuthResult(success=result, handled=True)
         else:
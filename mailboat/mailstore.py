@@ -24,52 +24,89 @@ it does not know the directory structure, even the user owns it. It just store m
 
 from email.message import EmailMessage
 from dataclasses import dataclass
+from hashlib import sha1
 from typing import Optional
 from .utils.storage import (
     CommonStorage,
-    DataclassCommonStorageAdapter,
     CommonStorageRecordWrapper,
+    dataclass_adapter,
 )
 
 
-@dataclass
+def hash_message_id(message_id: str) -> str:
+    """Build the constant-size dedupe key for a message id.
+    Message ids are arbitrary-length strings; hashing keeps the indexed key
+    short and the comparisons cheap.
+    """
+    return sha1(message_id.encode("ascii", "replace")).hexdigest()
+
+
+@dataclass(slots=True)
 class MailStoreRecord(object):
     message_id: str
     raw_mail: str
     ref_count: int
+    message_id_hash: Optional[str] = None
 
 
 class MailStore(CommonStorageRecordWrapper[MailStoreRecord]):
     def __init__(self, common_storage: CommonStorage) -> None:
-        super().__init__(common_storage, DataclassCommonStorageAdapter(MailStoreRecord))
+        super().__init__(common_storage, dataclass_adapter(MailStoreRecord))
 
     async def store_mail(self, mail: EmailMessage) -> MailStoreRecord:
         """store a mail with it's message id."""
         assert "message-id" in mail
         msg_id = mail["message-id"]
-        record = await self.find_one({"message_id": msg_id})
-        if record:
-            record.ref_count += 1
-            await self.update_one({"message_id": msg_id}, record)
-            return record
-        else:
-            new_record = MailStoreRecord(
-                message_id=msg_id,
-                raw_mail=mail.as_string(),
-                ref_count=1,
+        msg_id_hash = hash_message_id(msg_id)
+
+        def build_new_record() -> dict:
+            # serializing the mail is O(message size), only pay for it on insert
+            return self.adapter.record2dict(
+                MailStoreRecord(
+                    message_id=msg_id,
+                    raw_mail=mail.as_string(),
+                    ref_count=1,
+                    message_id_hash=msg_id_hash,
+                )
             )
-            await self.store(new_record)
-            return new_record
+
+        doc = await self.common_storage.incr_field(
+            {"message_id_hash": msg_id_hash},
+            "ref_count",
+            1,
+        )
+        if doc is None:
+            # records from before the hash field exist only under their
+            # message_id; bump those instead of storing a duplicate
+            doc = await self.common_storage.incr_field(
+                {"message_id": msg_id},
+                "ref_count",
+                1,
+                default=build_new_record,
+            )
+        assert doc is not None
+        return self.adapter.dict2record(doc)
 
     async def deref_mail_by_id(self, message_id: str) -> Optional[MailStoreRecord]:
         """Decrease reference count of a mail with `message_id`.
         If the mail's reference count is not greater than zero, it will be deleted.
         """
-        record = await self.find_one({"message_id": message_id})
-        if record:
-            record.ref_count -= 1
-            if record.ref_count <= 0:
-                await self.remove_one({"message_id": message_id})
-            return record
+        doc = await self.common_storage.incr_field(
+            {"message_id_hash": hash_message_id(message_id)},
+            "ref_count",
+            -1,
+            remove_on_zero=True,
+        )
+        if doc is None:
+            # legacy records have no hash field; without this fallback their
+            # reference count could never drop and they would live forever
+            doc = await self.common_storage.incr_field(
+                {"message_id": message_id},
+                "ref_count",
+                -1,
+                remove_on_zero=True,
+            )
+        if doc:
+            return self.adapter.dict2record(doc)
         else:
             return None
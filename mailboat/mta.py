@@ -1,13 +1,19 @@
 import asyncio
 import email.policy
+import email.utils
+from collections import OrderedDict, deque
+from itertools import islice
 from asyncio import Future
 from concurrent.futures import ThreadPoolExecutor
-from copy import deepcopy
+from copy import copy
 from dataclasses import dataclass
 from email.headerregistry import BaseHeader
 from email.message import EmailMessage
-from email.parser import Parser
+from email.parser import BytesParser
 import logging
+import os
+import re
+import sys
 from time import perf_counter
 from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple, cast
 import aiosmtplib
@@ -23,9 +29,32 @@ from unqlite import Collection, UnQLite
 from asyncio.locks import Lock
 
 from base64 import standard_b64decode, standard_b64encode
+from functools import lru_cache, partial
 
 from .utils.perf import async_perf_point
 
+DELIVERY_BATCH_MAX = 16
+# how many queued messages the deliveryman drains per tick
+
+DELIVERY_TASKS_KEPT = 4096
+# how many recent delivery tasks stay inspectable on the transfer agent
+
+DELIVERY_CONCURRENCY_MAX = 64
+# how many deliveries may run at once; each in-flight one holds a parsed
+# message tree, so this also caps the deliveryman's peak memory
+
+SMTP_CLIENT_IDLE_TIMEOUT = 100.0
+# seconds a pooled outbound SMTP connection may sit unused before reconnect
+
+_LOCAL_PEER_PREFIXES = ("127.0.0.1", "::1", "localhost")
+
+_ADDR_RE = re.compile(r"^[^@\s,<>]+@([^@\s,<>]+)$")
+# validates a bare mailbox and captures its host part in one pass
+
+_parse_address = lru_cache(maxsize=4096)(address.parse)
+# flanker's parse is regex-heavy and the deliveryman sees the same
+# Delivered-To strings over and over during a fanout
+
 LocalDeliveryHandler = Callable[[EmailMessage], Awaitable[Any]]
 SMTPAuthHandler = Callable[[SMTP, str, Any], Awaitable[AuthResult]] # the second parameter is method, the third is the data.
 # As method "login", "plain", the data is a `LoginPassword`
@@ -34,6 +63,9 @@ class EmailQueue(Protocol):
     def get(self) -> Awaitable[Tuple[EmailMessage, int]]:
         ...
 
+    def get_batch(self, max_n: int) -> Awaitable[List[Tuple[EmailMessage, int]]]:
+        ...
+
     def remove(self, index: int) -> Awaitable[None]:
         ...
 
@@ -41,7 +73,18 @@ class EmailQueue(Protocol):
         ...
 
 
-@dataclass
+def clone_message_for_headers(message: EmailMessage) -> EmailMessage:
+    """Clone `message` sharing its payload, copying only the header list.
+    The per-recipient copies in `TransferAgent.handle_message` differ in one
+    header; deepcopy would walk every header and the whole body for each
+    recipient.
+    """
+    cloned = copy(message)
+    cloned._headers = list(message._headers)  # type: ignore # keep the original intact
+    return cloned
+
+
+@dataclass(slots=True)
 class DeliveryTask(object):
     message_id: str
     delivering_address: str
@@ -84,76 +127,217 @@ class _SMTPDHandler(AsyncMessage):  # TODO: support OAuth2
         if words == aiosmtpd.smtp.MISSING:
             return AuthResult(success=False, handled=False)
         decoded_words = standard_b64decode(cast(bytes, words))
-        parts = decoded_words.split(b"\0")
-        if parts:
-            if not parts[0]:
-                parts.pop(0)
-        if len(parts) != 2:
-            return AuthResult(success=False, handled=True)
+        # [authzid] NUL authcid NUL password; locate the separators instead of
+        # materializing a split list
+        i = decoded_words.find(b"\x00")
+        j = decoded_words.find(b"\x00", i + 1) if i >= 0 else -1
+        if j < 0:
+            if i <= 0:
+                return AuthResult(success=False, handled=True)
+            username, password = decoded_words[:i], decoded_words[i + 1 :]
+        else:
+            if i != 0 or decoded_words.find(b"\x00", j + 1) >= 0:
+                return AuthResult(success=False, handled=True)
+            username, password = decoded_words[i + 1 : j], decoded_words[j + 1 :]
         return await self.smtp_auth_handler(
-            server, "plain", LoginPassword(parts[0], parts[1])
+            server, "plain", LoginPassword(username, password)
         )
 
     async def handle_message(self, message: EmailMessage):
         await self.message_handler(message)
 
 
+_EMAIL_QUEUE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=min(32, (os.cpu_count() or 2) * 2),
+    thread_name_prefix="mailboat.mta.unqlite_email_message_queue_executor",
+)
+# shared by every UnQLiteEmailMessageQueue; per-instance pools leaked
+# threads whenever a queue was re-created (tests, reconfiguration)
+
+
 class UnQLiteEmailMessageQueue(EmailQueue):
+    __logger = logging.getLogger("mailboat.mta.UnQLiteEmailMessageQueue")
+
+    PREFETCH_MAX = 8
+    # how many upcoming messages one executor hop pulls into memory
+
+    FLUSH_DELAY = 0.005
+    # seconds the flusher waits so concurrent puts coalesce into one write
+
+    FLUSH_RETRY_DELAY = 1.0
+    FLUSH_RETRY_DELAY_MAX = 30.0
+    # first and longest pause after a failed flush; retrying at FLUSH_DELAY
+    # pace would log a traceback every 5ms for as long as the disk is bad
+
+    PARSED_CACHE_MAX = 256
+    # parsed messages kept around so enqueue-then-dequeue skips the parser
+
     def __init__(self, coll: Collection) -> None:
+        self._loop = asyncio.get_event_loop()
+        # the loop the consumers (and the flusher) live on; the smtpd
+        # controller calls put() from its own thread and loop, and asyncio
+        # events touched from there never wake this one
         self._coll = coll
         self._coll.create()
-        self._ids = []
+        self._ids: "deque[int]" = deque()
         for doc in self._coll:
             self._ids.append(doc["__id"])
-        self.parser = Parser(EmailMessage, policy=email.policy.default)
-        self._thread_pool_executor = ThreadPoolExecutor(
-            thread_name_prefix="mailboat.mta.unqlite_email_message_queue_executor"
-        )
+        self._prefetched: Dict[int, bytes] = {}
+        self._pending: List[Tuple[bytes, EmailMessage]] = []
+        self._has_pending = asyncio.Event()
+        self._flush_task: Optional["Future[Any]"] = None
+        self._parsed: "OrderedDict[int, EmailMessage]" = OrderedDict()
+        self.parser = BytesParser(EmailMessage, policy=email.policy.default)
+        self._thread_pool_executor = _EMAIL_QUEUE_EXECUTOR
+        self._not_empty = asyncio.Event()
+        if self._ids:
+            self._not_empty.set()
         super().__init__()
 
+    @staticmethod
+    def _message_bytes(doc: Dict[str, Any]) -> bytes:
+        message = doc["message"]
+        if isinstance(message, bytes):
+            return message
+        # messages queued before the switch to as_bytes() were stored as str
+        return message.encode("utf-8")
+
+    def _fetch_many_sync(self, doc_ids: List[int]) -> Dict[int, bytes]:
+        fetched: Dict[int, bytes] = {}
+        for i in doc_ids:
+            doc = self._coll.fetch(i)
+            if doc is not None:
+                fetched[i] = self._message_bytes(doc)
+        return fetched
+
     async def get(self) -> Tuple[EmailMessage, int]:
         while len(self._ids) == 0:
-            await asyncio.sleep(0)  # TODO (rubicon): more effective way to block coroutine
-        result = self._coll.fetch(self._ids.pop(0))
-        doc_id: int = result["__id"]
-        message: str = result["message"]
-        return cast(EmailMessage, self.parser.parsestr(message)), doc_id
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        doc_id = self._ids.popleft()
+        parsed_cached = self._parsed.pop(doc_id, None)
+        if parsed_cached is not None:
+            self._prefetched.pop(doc_id, None)
+            return parsed_cached, doc_id
+        message = self._prefetched.pop(doc_id, None)
+        if message is None:
+            # fetch the requested message and prefetch the ones behind it in
+            # the same executor hop, so the next gets are memory pops
+            self._prefetched.update(
+                await asyncio.get_running_loop().run_in_executor(
+                    self._thread_pool_executor,
+                    self._fetch_many_sync,
+                    [doc_id, *islice(self._ids, self.PREFETCH_MAX)],
+                )
+            )
+            message = self._prefetched.pop(doc_id)
+        # parsing a large mail is CPU-heavy, keep it off the loop thread too
+        parsed = await asyncio.get_running_loop().run_in_executor(
+            self._thread_pool_executor, self.parser.parsebytes, message
+        )
+        return cast(EmailMessage, parsed), doc_id
 
     async def remove(self, index: int) -> None:
-        self._coll.delete(index)
+        self._parsed.pop(index, None)
+        await asyncio.get_running_loop().run_in_executor(
+            self._thread_pool_executor, self._coll.delete, index
+        )
+
+    def _store_many_sync(self, messages: List[bytes]) -> List[int]:
+        return [self._coll.store({"message": message}) for message in messages]
+
+    async def _cothread_flusher(self) -> None:
+        retry_delay = self.FLUSH_RETRY_DELAY
+        while True:
+            await self._has_pending.wait()
+            # let the puts of the other in-flight SMTP sessions pile up so the
+            # whole burst goes to disk in one executor hop
+            await asyncio.sleep(self.FLUSH_DELAY)
+            self._has_pending.clear()
+            pending, self._pending = self._pending, []
+            try:
+                new_ids = await asyncio.get_running_loop().run_in_executor(
+                    self._thread_pool_executor,
+                    self._store_many_sync,
+                    [message for message, _parsed in pending],
+                )
+            except Exception as e:
+                # an unhandled error would kill this task for good and wedge
+                # the queue silently while the smtpd keeps accepting mail;
+                # keep the batch, back off, and retry
+                self.__logger.exception(
+                    "flushing %d queued messages failed, retrying in %.0fs",
+                    len(pending),
+                    retry_delay,
+                    exc_info=e,
+                )
+                self._pending[:0] = pending
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.FLUSH_RETRY_DELAY_MAX)
+                self._has_pending.set()
+                continue
+            retry_delay = self.FLUSH_RETRY_DELAY
+            for new_id, (_message, parsed) in zip(new_ids, pending):
+                # the smtpd hands over compat32 Message objects; those must
+                # still go through the parser on get() to become EmailMessage
+                if isinstance(parsed, EmailMessage):
+                    self._parsed[new_id] = parsed
+            while len(self._parsed) > self.PARSED_CACHE_MAX:
+                self._parsed.popitem(last=False)
+            self._ids.extend(new_ids)
+            self._not_empty.set()
+
+    def _enqueue(self, payload: Tuple[bytes, EmailMessage]) -> None:
+        # always runs on the owner loop, so the flusher task and the events
+        # are touched from one loop only
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._cothread_flusher())
+        self._pending.append(payload)
+        self._has_pending.set()
 
     async def put(self, email: EmailMessage) -> None:
-        new_id = self._coll.store({"message": email.as_string()})
-        self._ids.append(new_id)
+        payload = (email.as_bytes(), email)
+        if asyncio.get_running_loop() is self._loop:
+            self._enqueue(payload)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, payload)
+
+    async def get_batch(self, max_n: int) -> List[Tuple[EmailMessage, int]]:
+        batch = [await self.get()]
+        while len(batch) < max_n and self._ids:
+            batch.append(await self.get())
+        return batch
 
 
 class MemoryEmailQueue(EmailQueue):
     def __init__(self) -> None:
-        self.container: Dict[int, EmailMessage] = {}
-        self.next_read_id = 0
+        self._loop = asyncio.get_event_loop()
+        self._queue: "asyncio.Queue[Tuple[EmailMessage, int]]" = asyncio.Queue()
         self.next_set_id = 0
-        self.lock_getting = Lock()
         super().__init__()
 
     async def get(self) -> Tuple[EmailMessage, int]:
-        async with self.lock_getting:
-            while self.next_read_id >= self.next_set_id:
-                await asyncio.sleep(0)
-            result = self.container.get(self.next_read_id)
-            result_id = self.next_read_id
-            self.next_read_id += 1
-            if result:
-                return result, result_id
-            else:
-                return await self.get()
+        return await self._queue.get()
 
     async def remove(self, id: int) -> None:
-        assert id in self.container
-        del self.container[id]
+        # entries leave the queue when they are got; nothing is kept around
+        pass
 
     async def put(self, message: EmailMessage) -> None:
-        self.container[self.next_set_id] = message
+        item = (message, self.next_set_id)
         self.next_set_id += 1
+        if asyncio.get_running_loop() is self._loop:
+            self._queue.put_nowait(item)
+        else:
+            # put() runs on the smtpd controller's loop; wake the getters on
+            # the loop they actually wait on
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def get_batch(self, max_n: int) -> List[Tuple[EmailMessage, int]]:
+        batch = [await self.get()]
+        while len(batch) < max_n and not self._queue.empty():
+            batch.append(await self.get())
+        return batch
 
 
 class TransferAgent(object):
@@ -173,6 +357,7 @@ class TransferAgent(object):
         custom_queue: Optional[EmailQueue] = None,
     ) -> None:
         self.mydomains = mydomains
+        self._mydomains_set = frozenset(sys.intern(d.lower()) for d in mydomains)
         self.database = database
         self.name = self_name
         self.hostname = hostname
@@ -183,7 +368,12 @@ class TransferAgent(object):
                 database.collection("{}.queue".format(self_name))
             )
         )
-        self.delivery_tasks: List[DeliveryTask] = []
+        self.delivery_tasks: "deque[DeliveryTask]" = deque(
+            maxlen=DELIVERY_TASKS_KEPT
+        )
+        self._tls_mode_cache: Dict[str, str] = {}
+        self._smtp_clients: Dict[str, Tuple[aiosmtplib.SMTP, float]] = {}
+        self._delivery_sem = asyncio.Semaphore(DELIVERY_CONCURRENCY_MAX)
         self.smtpd_controller = Controller(
             _SMTPDHandler(
                 self.handle_message,
@@ -198,6 +388,9 @@ class TransferAgent(object):
     def destory(self):  # TODO (rubicon): provide method for graceful shutdown
         self.smtpd_controller.stop()
         self._task_deliveryman.cancel("transfer agent destory")
+        for client, _last_used in self._smtp_clients.values():
+            client.close()
+        self._smtp_clients.clear()
 
     def start(self):
         self.smtpd_controller.start()
@@ -209,35 +402,41 @@ class TransferAgent(object):
         mail_to: BaseHeader = message["To"]
         mail_cc: BaseHeader = message["Cc"]
         mail_bcc: BaseHeader = message["BCC"]
-        target_address_lists: List[address.AddressList] = []
-        for delivering_list in filter(lambda x: x, (mail_to, mail_cc, mail_bcc)):
-            target_address_lists.append(
-                address.parse_list(delivering_list, strict=True)
-            )
+        if not (mail_to or mail_cc or mail_bcc):
+            # no recipients at all, skip the parsing and the fanout entirely
+            return
         should_be_delivered_to: List[str] = []
-        for list in target_address_lists:
-            for addr in list:
-                if addr.addr_type == "email":
-                    if addr.hostname in self.mydomains:
-                        should_be_delivered_to.append(
-                            addr.address
-                        )  # TODO (rubicon): verify spf and dkim before local delivery
-                    elif (
-                        isinstance(message["X-Peer"], str)
-                        and (
-                            message["X-Peer"].startswith("127.0.0.1")
-                            or message["X-Peer"].startswith("::1")
-                            or message["X-Peer"].startswith("localhost")
-                        )
-                        or internal
-                    ):
-                        should_be_delivered_to.append(addr.address)
+        is_local_peer = internal or (
+            isinstance(message["X-Peer"], str)
+            and message["X-Peer"].startswith(_LOCAL_PEER_PREFIXES)
+        )
+        if mail_to and not mail_cc and not mail_bcc and "," not in str(mail_to):
+            # the overwhelmingly common case: one To recipient, nothing else
+            target_addresses = [email.utils.parseaddr(str(mail_to))]
+        else:
+            target_addresses = email.utils.getaddresses(
+                [str(h) for h in (mail_to, mail_cc, mail_bcc) if h]
+            )
+        for _display_name, addr in target_addresses:
+            matched = _ADDR_RE.match(addr)
+            if not matched:
+                continue
+            hostname = sys.intern(matched.group(1).lower())
+            if hostname in self._mydomains_set:
+                should_be_delivered_to.append(
+                    addr
+                )  # TODO (rubicon): verify spf and dkim before local delivery
+            elif is_local_peer:
+                should_be_delivered_to.append(addr)
         queue_futures: List[Future] = []
         for addr in should_be_delivered_to:
-            msg_copy = deepcopy(message)
+            msg_copy = clone_message_for_headers(message)
             if "delivered-to" in msg_copy:
-                del msg_copy["delivered-to"]
-            msg_copy["delivered-to"] = addr
+                # relayed messages carry one Delivered-To per hop;
+                # replace_header would rewrite only the first and keep the
+                # rest, so drop them all before stamping ours
+                del msg_copy["Delivered-To"]
+            msg_copy["Delivered-To"] = addr
             queue_futures.append(asyncio.ensure_future(self.queue.put(msg_copy)))
         await asyncio.gather(*queue_futures)
         self.__logger.info(
@@ -245,69 +444,208 @@ class TransferAgent(object):
         )
 
     async def remote_deliver(self, message: EmailMessage):
+        host_key: Optional[str] = None
+        if "delivered-to" in message:
+            delivered_to = _parse_address(str(message["delivered-to"]))
+            if delivered_to and delivered_to.hostname:
+                host_key = delivered_to.hostname
         for k in ["X-Peer", "X-MailFrom", "X-RcptTo", "Delivered-To"]:
             if k in message:
                 del message[k]
+        client = await self._acquire_smtp_client(host_key)
         try:
-            await aiosmtplib.send(message, use_tls=True)
-        except SMTPAuthenticationError:
-            pass
-        except:
             try:
-                await aiosmtplib.send(message, start_tls=True)
+                await client.send_message(message)
             except SMTPAuthenticationError:
                 pass
-            except:
-                await aiosmtplib.send(message)
+        finally:
+            self._release_smtp_client(host_key, client)
+
+    async def _acquire_smtp_client(self, host_key: Optional[str]) -> aiosmtplib.SMTP:
+        """Take the pooled connection for `host_key` if it is still fresh,
+        otherwise open a new one. Reusing the session saves the TCP+TLS
+        handshake when the same host is delivered to repeatedly.
+        """
+        if host_key:
+            pooled = self._smtp_clients.pop(host_key, None)
+            if pooled:
+                client, last_used = pooled
+                if (
+                    client.is_connected
+                    and perf_counter() - last_used < SMTP_CLIENT_IDLE_TIMEOUT
+                ):
+                    return client
+                client.close()
+        return await self._connect_remote(host_key)
+
+    def _release_smtp_client(self, host_key: Optional[str], client: aiosmtplib.SMTP):
+        if host_key and client.is_connected:
+            stale = self._smtp_clients.get(host_key)
+            if stale:
+                stale[0].close()
+            self._smtp_clients[host_key] = (client, perf_counter())
+        else:
+            client.close()
+
+    @staticmethod
+    async def _connect_remote_mode(mode: str) -> aiosmtplib.SMTP:
+        if mode == "tls":
+            client = aiosmtplib.SMTP(use_tls=True)
+        elif mode == "starttls":
+            client = aiosmtplib.SMTP(start_tls=True)
+        else:
+            client = aiosmtplib.SMTP()
+        await client.connect()
+        return client
+
+    async def _connect_remote(self, host_key: Optional[str] = None) -> aiosmtplib.SMTP:
+        """Open one SMTP connection for a batch of remote deliveries, with the
+        same TLS fallback cascade as `remote_deliver`. The transport mode which
+        worked is remembered per `host_key`, so steady-state deliveries skip
+        the doomed handshakes of the cascade.
+        """
+        if host_key:
+            mode = self._tls_mode_cache.get(host_key)
+            if mode:
+                try:
+                    return await self._connect_remote_mode(mode)
+                except (aiosmtplib.SMTPException, OSError):
+                    # the host changed its capabilities, probe again
+                    del self._tls_mode_cache[host_key]
+        last_error: Optional[Exception] = None
+        for mode in ("tls", "starttls", "plain"):
+            try:
+                client = await self._connect_remote_mode(mode)
+                if host_key:
+                    self._tls_mode_cache[host_key] = mode
+                return client
+            except (aiosmtplib.SMTPException, OSError) as e:
+                last_error = e
+        assert last_error is not None
+        raise last_error
+
+    async def _deliver_remote_batch(
+        self,
+        batch: List[Tuple[EmailMessage, int, DeliveryTask]],
+        host_key: Optional[str] = None,
+    ):
+        """Deliver a batch of messages for one destination host over a single
+        connection, so the TCP+TLS handshake is paid once per batch instead of
+        once per message.
+        """
+        # a message leaves the queue whether its delivery succeeded or not,
+        # like local delivery does: the ids are already popped, so keeping
+        # the document around would only grow the collection until restart
+        # without anything ever retrying it
+        try:
+            client = await self._acquire_smtp_client(host_key)
+        except (aiosmtplib.SMTPException, OSError) as e:
+            for message, index, delivery_task in batch:
+                asyncio.ensure_future(self.queue.remove(index))
+                delivery_task.done = True
+                delivery_task.success = False
+                delivery_task.status_message = str(e)
+            return
+        try:
+            for message, index, delivery_task in batch:
+                for k in ["X-Peer", "X-MailFrom", "X-RcptTo", "Delivered-To"]:
+                    if k in message:
+                        del message[k]
+                try:
+                    await client.send_message(message)
+                except SMTPAuthenticationError:
+                    pass
+                except (aiosmtplib.SMTPException, OSError) as e:
+                    delivery_task.done = True
+                    delivery_task.success = False
+                    delivery_task.status_message = str(e)
+                finally:
+                    asyncio.ensure_future(self.queue.remove(index))
+                if not delivery_task.done:
+                    delivery_task.done = True
+                    delivery_task.success = True
+        finally:
+            self._release_smtp_client(host_key, client)
+
+    async def _bounded_delivery(self, delivery: Awaitable[Any]):
+        async with self._delivery_sem:
+            await delivery
+
+    def _when_local_delivery_done(
+        self, fut: Future, index: int, delivery_task: DeliveryTask
+    ):
+        asyncio.ensure_future(self.queue.remove(index))
+        delivery_task.done = True
+        if not fut.exception():
+            delivery_task.success = True
+        else:
+            delivery_task.success = False
+            delivery_task.status_message = str(fut.exception())
 
     async def _cothread_deliveryman(self):  # TODO (rubicon): custom "pipeline"
         __logger = self.__logger.getChild("deliveryman")
         while True:
             try:
-                message, index = await self.queue.get()
-                if "delivered-to" in message:
-                    if "bcc" in message:
-                        del message["bcc"]
-                        message["bcc"] = message["delivered-to"]
-                    delivered_to = address.parse(message["delivered-to"])
-                    delivery_task = DeliveryTask(
-                        message["message-id"],
-                        delivering_address=delivered_to.address,
-                        done=False,
-                        success=False,
-                    )
-                    self.delivery_tasks.append(
-                        delivery_task
-                    )
-                    # TODO (rubicon): use a eventbus instead a list for delivery tasks
-                    if delivered_to.hostname in self.mydomains:
-                        fut = asyncio.ensure_future(
-                            self.local_delivery_handler(message)
+                batch = await self.queue.get_batch(DELIVERY_BATCH_MAX)
+                remote_batches: Dict[
+                    str, List[Tuple[EmailMessage, int, DeliveryTask]]
+                ] = {}
+                for message, index in batch:
+                    # the messages of a batch are already popped from the
+                    # queue, so one poisoned message must only lose itself,
+                    # not discard its batchmates
+                    try:
+                        if "delivered-to" not in message:
+                            continue
+                        if "bcc" in message:
+                            # a message may arrive with several Bcc lines;
+                            # replace_header would leave the extras in the
+                            # delivered mail and disclose their recipients
+                            delivered_to_value = message["delivered-to"]
+                            del message["Bcc"]
+                            message["Bcc"] = delivered_to_value
+                        delivered_to = _parse_address(str(message["delivered-to"]))
+                        delivery_task = DeliveryTask(
+                            message["message-id"],
+                            delivering_address=delivered_to.address,
+                            done=False,
+                            success=False,
                         )
-
-                        @fut.add_done_callback
-                        def when_local_delivery_done(fut: Future):
-                            asyncio.ensure_future(self.queue.remove(index))
-                            delivery_task.done = True
-                            if not fut.exception():
-                                delivery_task.success = True
-                            else:
-                                delivery_task.success = False
-                                delivery_task.status_message = str(fut.exception())
-
-                    else:
-                        fut = asyncio.ensure_future(self.remote_deliver(message))
-
-                        @fut.add_done_callback
-                        def when_remote_delivery_done(fut: Future):
-                            asyncio.ensure_future(self.queue.remove(index))
-                            delivery_task.done = True
-                            if not fut.exception():
-                                delivery_task.success = True
-                            else:
-                                delivery_task.success = False
-                                delivery_task.status_message = str(fut.exception())
-
+                        self.delivery_tasks.append(
+                            delivery_task
+                        )
+                        # TODO (rubicon): use a eventbus instead a list for delivery tasks
+                        if (
+                            sys.intern(delivered_to.hostname.lower())
+                            in self._mydomains_set
+                        ):
+                            fut = asyncio.ensure_future(
+                                self._bounded_delivery(
+                                    self.local_delivery_handler(message)
+                                )
+                            )
+                            fut.add_done_callback(
+                                partial(
+                                    self._when_local_delivery_done,
+                                    index=index,
+                                    delivery_task=delivery_task,
+                                )
+                            )
+                        else:
+                            remote_batches.setdefault(
+                                delivered_to.hostname, []
+                            ).append((message, index, delivery_task))
+                    except Exception as e:
+                        __logger.exception(
+                            "could not build the delivery of a queued message",
+                            exc_info=e,
+                        )
+                for hostname, host_batch in remote_batches.items():
+                    asyncio.ensure_future(
+                        self._bounded_delivery(
+                            self._deliver_remote_batch(host_batch, hostname)
+                        )
+                    )
             except Exception as e:
                 __logger.exception(exc_info=e)
 
@@ -14,8 +14,9 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with Mailboat.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
 from email.message import EmailMessage
-from typing import AsyncIterator, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from .usr import MailRecord
 from ..mailstore import MailStore, MailStoreRecord
 from ..utils.storage import CommonStorage
@@ -23,6 +24,10 @@ from .storage import MailDirectoryStorage
 
 
 class MailDirectory(object):
+    GET_MAILS_BATCH = 64
+    # tuples handed over per get_mails suspension; amortizes the event-loop
+    # scheduling cost of __anext__ across a large fetch
+
     def __init__(self, common_storage: CommonStorage, mailstore: MailStore) -> None:
         self.mail_directory_store = MailDirectoryStorage(common_storage)
         self.mailstore = mailstore
@@ -32,22 +37,46 @@ class MailDirectory(object):
         if not exists_ok:
             if await self.exists_mail(mail["message-id"]):
                 raise KeyError
-        mail_store_record = await self.mailstore.store_mail(mail)
-        mail_record = MailRecord(path=path, message_id=mail_store_record.message_id)
-        await self.mail_directory_store.store(mail_record)
+        # the directory record only needs the message id, which is known
+        # up front, so both writes can be in flight at the same time
+        mail_record = MailRecord(path=path, message_id=mail["message-id"])
+        await asyncio.gather(
+            self.mailstore.store_mail(mail),
+            self.mail_directory_store.store(mail_record),
+        )
 
     async def get_mails(
         self, path_prefix: str
-    ) -> AsyncIterator[Tuple[MailRecord, Optional[MailStoreRecord]]]:
-        async for doc in self.mail_directory_store.find({}):
-            if doc.path.startswith(path_prefix):
-                yield (
+    ) -> AsyncIterator[List[Tuple[MailRecord, Optional[MailStoreRecord]]]]:
+        matched = [
+            doc
+            async for doc in self.mail_directory_store.find_by_prefix(
+                "path", path_prefix
+            )
+        ]
+        # one lookup per distinct message id, all in flight at once, instead
+        # of one awaited round-trip per directory record
+        lookups: Dict[str, "asyncio.Future[Optional[MailStoreRecord]]"] = {}
+        for doc in matched:
+            if doc.message_id and doc.message_id not in lookups:
+                lookups[doc.message_id] = asyncio.ensure_future(
+                    self.mailstore.find_one({"message_id": doc.message_id})
+                )
+        if lookups:
+            await asyncio.gather(*lookups.values())
+        batch: List[Tuple[MailRecord, Optional[MailStoreRecord]]] = []
+        for doc in matched:
+            batch.append(
+                (
                     doc,
-                    (await self.mailstore.find_one({"message_id": doc.message_id}))
-                    if doc.message_id
-                    else None,
+                    lookups[doc.message_id].result() if doc.message_id else None,
                 )
+            )
+            if len(batch) >= self.GET_MAILS_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     async def exists_mail(self, message_id: str) -> bool:
-        record = await self.mail_directory_store.find_one({"message_id": message_id})
-        return not not record
+        return await self.mail_directory_store.exists({"message_id": message_id})
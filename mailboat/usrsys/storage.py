@@ -1,26 +1,144 @@
+from collections import OrderedDict
+from hashlib import sha256
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
 from ..utils.storage import (
-    DataclassCommonStorageAdapter,
     CommonStorageRecordWrapper,
     CommonStorage,
+    dataclass_adapter,
 )
 from .usr import MailRecord, UserRecord, ProfileRecord
-from ..utils.asec import password_check
+from ..utils.asec import password_check, password_hashing
+
+import asyncio
+
+_dummy_hash: Optional[str] = None
+_dummy_hash_lock = asyncio.Lock()
+
+
+async def _get_dummy_hash() -> str:
+    """The hash checked against when a username does not exist, so the
+    unknown-user path burns the same KDF cost as a real verification.
+    Computed once on first use; hashing is deliberately expensive.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        async with _dummy_hash_lock:
+            if _dummy_hash is None:
+                _dummy_hash = await password_hashing(b"mailboat.dummy")
+    return _dummy_hash
 
 
 class UserRecordStorage(CommonStorageRecordWrapper[UserRecord]):
+    """User records are read on every auth but rarely written, so lookups by
+    username go through a bounded in-memory cache which is invalidated before
+    any write touching the record.
+
+    Verified passwords are cached too: SMTP/IMAP clients re-authenticate on
+    every connection, and the KDF dominates auth latency. Only the boolean
+    outcome is kept, keyed by username plus a password digest, with a short
+    TTL so a password change stops matching soon even if invalidation misses.
+    """
+
+    CACHE_LIMIT = 10240
+    CACHE_TTL = 300.0  # seconds
+    CACHE_NEGATIVE_TTL = 30.0
+    # misses are cached too so probing unknown usernames cannot force a
+    # backend round-trip per attempt, but only briefly in case the user
+    # is created moments later
+    PASSWORD_CACHE_LIMIT = 10240
+    PASSWORD_CACHE_TTL = 120.0  # seconds
+
     def __init__(self, common_storage: CommonStorage) -> None:
-        super().__init__(common_storage, DataclassCommonStorageAdapter(UserRecord))
-    
+        super().__init__(common_storage, dataclass_adapter(UserRecord))
+        self._username_cache: "OrderedDict[str, Tuple[Optional[UserRecord], float]]" = (
+            OrderedDict()
+        )
+        self._password_cache: "OrderedDict[Tuple[str, bytes], Tuple[bool, float]]" = (
+            OrderedDict()
+        )
+
+    def _invalidate(self, query: Dict[str, Any], record: Optional[UserRecord] = None):
+        if record:
+            self._invalidate_username(record.username)
+        if "username" in query:
+            self._invalidate_username(query["username"])
+
+    def _invalidate_username(self, username: str):
+        self._username_cache.pop(username, None)
+        # password entries are keyed by (username, digest); writes are rare
+        # enough that a scan here is cheaper than a second index
+        for key in [k for k in self._password_cache if k[0] == username]:
+            del self._password_cache[key]
+
+    async def find_one(self, query: Dict[str, Any]) -> Optional[UserRecord]:
+        if len(query) == 1 and "username" in query:
+            username = query["username"]
+            entry = self._username_cache.get(username)
+            if entry is not None:
+                record, stamp = entry
+                ttl = self.CACHE_TTL if record is not None else self.CACHE_NEGATIVE_TTL
+                if monotonic() - stamp < ttl:
+                    self._username_cache.move_to_end(username)
+                    return record
+                del self._username_cache[username]
+            record = await super().find_one(query)
+            self._username_cache[username] = (record, monotonic())
+            if len(self._username_cache) > self.CACHE_LIMIT:
+                self._username_cache.popitem(last=False)
+            return record
+        return await super().find_one(query)
+
+    async def store(self, record: UserRecord) -> UserRecord:
+        self._invalidate_username(record.username)
+        return await super().store(record)
+
+    async def update_one(
+        self, query: Dict[str, Any], updated: UserRecord
+    ) -> Optional[UserRecord]:
+        self._invalidate(query, updated)
+        return await super().update_one(query, updated)
+
+    async def remove_one(self, query: Dict[str, Any]) -> bool:
+        if "username" in query:
+            self._invalidate_username(query["username"])
+        else:
+            # cannot tell which cached username the removed record carries
+            self._username_cache.clear()
+            self._password_cache.clear()
+        return await super().remove_one(query)
+
+    async def remove(self, query: Dict[str, Any]) -> int:
+        self._username_cache.clear()
+        self._password_cache.clear()
+        return await super().remove(query)
+
     async def check_user_password(self, username: str, password: bytes) -> bool:
+        key = (username, sha256(password).digest())
+        cached = self._password_cache.get(key)
+        if cached is not None:
+            result, stamp = cached
+            if monotonic() - stamp < self.PASSWORD_CACHE_TTL:
+                self._password_cache.move_to_end(key)
+                return result
+            del self._password_cache[key]
         doc = await self.find_one({'username': username})
         if not doc:
+            # an early return here would make unknown usernames answer orders
+            # of magnitude faster than known ones — a user-enumeration oracle
+            await password_check(password, await _get_dummy_hash())
             return False
-        return await password_check(password, doc.password_b64hash)
+        result = await password_check(password, doc.password_b64hash)
+        self._password_cache[key] = (result, monotonic())
+        if len(self._password_cache) > self.PASSWORD_CACHE_LIMIT:
+            self._password_cache.popitem(last=False)
+        return result
 
 
 class ProfileRecordStorage(CommonStorageRecordWrapper[ProfileRecord]):
     def __init__(self, common_storage: CommonStorage) -> None:
-        super().__init__(common_storage, DataclassCommonStorageAdapter(ProfileRecord))
+        super().__init__(common_storage, dataclass_adapter(ProfileRecord))
 
 
 class MailDirectoryStorage(CommonStorageRecordWrapper[MailRecord]):
@@ -28,4 +146,4 @@ class MailDirectoryStorage(CommonStorageRecordWrapper[MailRecord]):
         self,
         common_storage: CommonStorage,
     ) -> None:
-        super().__init__(common_storage, DataclassCommonStorageAdapter(MailRecord))
+        super().__init__(common_storage, dataclass_adapter(MailRecord))
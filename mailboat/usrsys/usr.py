@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import Literal, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class UserRecord(object):
     nickname: str
     username: str
@@ -12,7 +12,7 @@ class UserRecord(object):
     email_address: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ProfileRecord(object):
     identity: str  # should be a UUID string
     member_no: Optional[str] = None
@@ -21,7 +21,7 @@ class ProfileRecord(object):
     physical_sex: Optional[Literal["male", "female"]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class MailRecord(object):
     path: str
     message_id: Optional[str]
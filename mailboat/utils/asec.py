@@ -1,34 +1,107 @@
-from . import global_executor
 import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from typing import List, Tuple
+from nacl.exceptions import InvalidkeyError
 from nacl.pwhash import argon2id
-from base64 import standard_b64decode, standard_b64encode
+from base64 import standard_b64decode
+
+_VERIFY_CACHE_LIMIT = 4096
+_verify_cache: "OrderedDict[bytes, None]" = OrderedDict()
+_verify_cache_lock = threading.Lock()
+# successful verifications only, keyed by a keyed digest of password and
+# stored hash; a repeated login skips the whole KDF. Guarded by a real lock
+# because the sync functions run on executor threads.
+
+_kdf_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 4,
+    thread_name_prefix="mailboat.utils.asec.kdf_executor",
+)
+_kdf_semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+# argon2id holds 64MB per running invocation; the semaphore caps an auth
+# burst at cpu-count concurrent KDFs instead of one thread (and 64MB) per
+# pending login, and keeps the shared executors free for I/O work
+
+
+OPSLIMIT = int(os.environ.get("MAILBOAT_ARGON2_OPSLIMIT", "3"))
+MEMLIMIT = int(
+    os.environ.get("MAILBOAT_ARGON2_MEMLIMIT", str(argon2id.MEMLIMIT_INTERACTIVE))
+)
+# OWASP-recommended argon2id cost by default (64MB, 3 iterations); libsodium
+# fixes parallelism at 1. Deployments can tune both through the environment.
+# verify() reads the cost from the hash string itself, so hashes produced
+# under other parameters keep verifying.
 
 
 def password_hashing_sync(password: bytes) -> str:
-    return standard_b64encode(
-        argon2id.str(
-            password,
-            opslimit=argon2id.OPSLIMIT_SENSITIVE,
-            memlimit=argon2id.OPSLIMIT_SENSITIVE,
-        )
+    # the PHC string libsodium returns is already ASCII-safe; wrapping it in
+    # base64 again just cost an encode per hash and a decode per verify
+    return argon2id.str(
+        password,
+        opslimit=OPSLIMIT,
+        memlimit=MEMLIMIT,
     ).decode("ascii")
 
 
 def password_check_sync(password: bytes, password_hash: str) -> bool:
-    return argon2id.verify(standard_b64decode(password_hash.encode("ascii")), password)
+    key = blake2b(
+        password + b"\x00" + password_hash.encode("ascii"),
+        key=b"mailboat.asec.verify",
+    ).digest()
+    with _verify_cache_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return True
+    hash_bytes = (
+        password_hash.encode("ascii")
+        if password_hash.startswith("$argon2")
+        # hashes from before the base64 wrapping was dropped
+        else standard_b64decode(password_hash.encode("ascii"))
+    )
+    try:
+        result = argon2id.verify(hash_bytes, password)
+    except InvalidkeyError:
+        # verify() raises on mismatch; a wrong password is a normal outcome
+        # here, not an exception for the auth handlers to trip over
+        return False
+    if result:
+        with _verify_cache_lock:
+            _verify_cache[key] = None
+            if len(_verify_cache) > _VERIFY_CACHE_LIMIT:
+                _verify_cache.popitem(last=False)
+    return result
 
 
-def password_hashing(password: bytes) -> asyncio.Future[str]:
-    return asyncio.ensure_future(
-        asyncio.get_running_loop().run_in_executor(
-            global_executor.get(), password_hashing_sync, password
+async def password_hashing(password: bytes) -> str:
+    async with _kdf_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(
+            _kdf_executor, password_hashing_sync, password
         )
-    )
 
 
-def password_check(password: bytes, password_hash: str) -> asyncio.Future[bool]:
-    return asyncio.ensure_future(
-        asyncio.get_running_loop().run_in_executor(
-            global_executor.get(), password_check_sync, password, password_hash
+async def password_check(password: bytes, password_hash: str) -> bool:
+    async with _kdf_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(
+            _kdf_executor, password_check_sync, password, password_hash
+        )
+
+
+def password_check_batch_sync(items: List[Tuple[bytes, str]]) -> List[bool]:
+    return [
+        password_check_sync(password, password_hash)
+        for password, password_hash in items
+    ]
+
+
+async def password_check_batch(items: List[Tuple[bytes, str]]) -> List[bool]:
+    """Verify many (password, hash) pairs in one executor dispatch, keeping
+    one thread hot instead of paying a pool hop per pair. A mismatching pair
+    yields False in its slot rather than aborting the batch.
+    """
+    async with _kdf_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(
+            _kdf_executor, password_check_batch_sync, list(items)
         )
-    )
@@ -1,13 +1,35 @@
-from asyncio import get_running_loop, Future, ensure_future
-from typing import Tuple
+from asyncio import get_running_loop
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Tuple
 import spf
 from . import global_executor
 
+CACHE_LIMIT = 4096
+CACHE_TTL = 300.0  # seconds, for definitive results
+CACHE_TTL_TEMPERROR = 30.0
+# one relay bursting mail repeats the same (ip, domain) lookup within
+# seconds; caching saves a blocking DNS TXT round-trip per message
 
-def check(
+_cache: "OrderedDict[Tuple[str, str], Tuple[Tuple[str, str], float]]" = OrderedDict()
+
+
+async def check(
     from_ip: str, from_addr: str, from_domain_name: str
-) -> Future[Tuple[str, str]]:
-    a = get_running_loop().run_in_executor(
+) -> Tuple[str, str]:
+    key = (from_ip, from_domain_name)
+    entry = _cache.get(key)
+    if entry is not None:
+        result, stamp = entry
+        ttl = CACHE_TTL_TEMPERROR if result[0] == "temperror" else CACHE_TTL
+        if monotonic() - stamp < ttl:
+            _cache.move_to_end(key)
+            return result
+        del _cache[key]
+    result = await get_running_loop().run_in_executor(
         global_executor.get(), spf.check2, from_ip, from_addr, from_domain_name
     )
-    return ensure_future(a)
+    _cache[key] = (result, monotonic())
+    if len(_cache) > CACHE_LIMIT:
+        _cache.popitem(last=False)
+    return result
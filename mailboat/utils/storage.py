@@ -2,10 +2,13 @@ from typing import (
     Any,
     AsyncIterable,
     Awaitable,
+    Callable,
     Dict,
     Generic,
+    Iterable,
     List,
     Optional,
+    Tuple,
     Type,
     TypeVar,
 )
@@ -34,7 +37,26 @@ class RecordStorage(Generic[T]):
 
 
 class CommonStorage(RecordStorage[Dict[str, Any]]):
-    pass
+    def find_by_prefix(self, field: str, prefix: str) -> AsyncIterable[Dict[str, Any]]:
+        ...
+
+    def exists(self, query: Dict[str, Any]) -> Awaitable[bool]:
+        ...
+
+    def store_many(
+        self, records: List[Dict[str, Any]]
+    ) -> Awaitable[List[Dict[str, Any]]]:
+        ...
+
+    def incr_field(
+        self,
+        query: Dict[str, Any],
+        field: str,
+        delta: int,
+        default: Optional[Callable[[], Dict[str, Any]]] = None,
+        remove_on_zero: bool = False,
+    ) -> Awaitable[Optional[Dict[str, Any]]]:
+        ...
 
 
 class CommonStorageAdapter(Generic[T]):
@@ -49,6 +71,31 @@ class CommonStorageAdapter(Generic[T]):
         ...
 
 
+class _RecordIterator(Generic[T]):
+    """Maps documents from a backend scan to records while iterating.
+
+    Does what an ``async for doc: yield dict2record(doc)`` generator does,
+    but without stacking a second generator frame (and its per-item
+    suspend/resume) on top of the backend's iterator.
+    """
+
+    __slots__ = ("_source", "_dict2record")
+
+    def __init__(
+        self,
+        source: AsyncIterable[Dict[str, Any]],
+        dict2record: Callable[[Dict[str, Any]], T],
+    ) -> None:
+        self._source = source.__aiter__()
+        self._dict2record = dict2record
+
+    def __aiter__(self) -> "_RecordIterator[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        return self._dict2record(await self._source.__anext__())
+
+
 class CommonStorageRecordWrapper(RecordStorage[T]):
     """
     A wrapper for `CommonStorage`, convert it to a `RecordStorage` which can read and write record directly.
@@ -66,30 +113,50 @@ class CommonStorageRecordWrapper(RecordStorage[T]):
     ) -> None:
         self.common_storage = common_storage
         self.adapter = adapter
+        # the converters are plain functions (see the adapter codegen); bind
+        # them once so the hot paths skip the two-step attribute lookup
+        self._record2dict = adapter.record2dict
+        self._dict2record = adapter.dict2record
         super().__init__()
 
     async def store(self, record: T) -> T:
-        d = self.adapter.record2dict(record)
-        result = await self.common_storage.store(d)
-        return self.adapter.dict2record(result)
+        # the backend stores the document as given and the records carry no
+        # backend-assigned fields, so the caller's record already is the
+        # result; rebuilding it from the returned dict was pure overhead
+        await self.common_storage.store(self._record2dict(record))
+        return record
+
+    async def store_many(self, records: Iterable[T]) -> List[T]:
+        records = list(records)
+        await self.common_storage.store_many(
+            [self._record2dict(record) for record in records]
+        )
+        return records
+
+    def find(self, query: Dict[str, Any]) -> AsyncIterable[T]:
+        return _RecordIterator(
+            self.common_storage.find(query), self._dict2record
+        )
 
-    async def find(self, query: Dict[str, Any]) -> AsyncIterable[T]:
-        async for doc in self.common_storage.find(query):
-            yield self.adapter.dict2record(doc)
+    def find_by_prefix(self, field: str, prefix: str) -> AsyncIterable[T]:
+        return _RecordIterator(
+            self.common_storage.find_by_prefix(field, prefix),
+            self._dict2record,
+        )
 
     async def find_one(self, query: Dict[str, Any]) -> Optional[T]:
         result = await self.common_storage.find_one(query)
         if result:
-            return self.adapter.dict2record(result)
+            return self._dict2record(result)
         else:
             return None
 
     async def update_one(self, query: Dict[str, Any], updated: T) -> Optional[T]:
         result = await self.common_storage.update_one(
-            query, self.adapter.record2dict(updated)
+            query, self._record2dict(updated)
         )
         if result:
-            return self.adapter.dict2record(result)
+            return self._dict2record(result)
         return None
 
     async def remove(self, query: Dict[str, Any]) -> int:
@@ -98,6 +165,9 @@ class CommonStorageRecordWrapper(RecordStorage[T]):
     async def remove_one(self, query: Dict[str, Any]) -> bool:
         return await self.common_storage.remove_one(query)
 
+    async def exists(self, query: Dict[str, Any]) -> bool:
+        return await self.common_storage.exists(query)
+
 
 import dataclasses
 
@@ -110,103 +180,408 @@ class DataclassCommonStorageAdapter(Generic[T], CommonStorageAdapter[T]):
     def __init__(self, datacls: Type[T]) -> None:
         assert dataclasses.is_dataclass(datacls), "datacls should be a dataclass"
         self.datacls = datacls
+        self._field_names = tuple(f.name for f in dataclasses.fields(datacls))
+        self.dict2record, self.record2dict = self._generate_converters()
         super().__init__()
 
-    def dict2record(self, d: Dict[str, Any]) -> T:
-        return self.datacls(**d)  # type: ignore # it should work
+    def _generate_converters(self):
+        """Compile both converters with the field names inlined as literals.
+
+        The generated functions index each field directly instead of looping
+        over the name tuple with getattr/getitem, which drops an iterator and
+        an attribute lookup per field on every conversion. This runs once per
+        dataclass since adapters are shared (see `dataclass_adapter`).
+        """
+        args = ", ".join(f"{name}=d[{name!r}]" for name in self._field_names)
+        items = ", ".join(f"{name!r}: r.{name}" for name in self._field_names)
+        namespace: Dict[str, Any] = {
+            "_cls": self.datacls,
+            "_sparse": self._dict2record_sparse,
+        }
+        exec(
+            # backend bookkeeping keys like UnQLite's __id are simply never
+            # read, so they are dropped without copying the dict
+            f"def dict2record(d):\n"
+            f"    try:\n"
+            f"        return _cls({args})\n"
+            f"    except KeyError:\n"
+            f"        return _sparse(d)\n"
+            f"def record2dict(r):\n"
+            f"    return {{{items}}}\n",
+            namespace,
+        )
+        return namespace["dict2record"], namespace["record2dict"]
+
+    def _dict2record_sparse(self, d: Dict[str, Any]) -> T:
+        # documents written before a field existed miss keys; keep them
+        # loadable through the slower known-fields-only path
+        return self.datacls(
+            **{name: d[name] for name in self._field_names if name in d}
+        )  # type: ignore # it should work
+
+
+from functools import lru_cache
 
-    def record2dict(self, record: T) -> Dict[str, Any]:
-        return dataclasses.asdict(record)
+
+@lru_cache(maxsize=None)
+def dataclass_adapter(datacls: Type[Any]) -> DataclassCommonStorageAdapter[Any]:
+    """Get the shared `DataclassCommonStorageAdapter` for `datacls`.
+    Adapters are stateless, so one instance per dataclass is enough.
+    """
+    return DataclassCommonStorageAdapter(datacls)
 
 
 import asyncio
+import threading
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
 
 from unqlite import UnQLite
 
+_STORAGE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=2,
+    thread_name_prefix="mailboat.utils.storage.UnQLiteStorage.executor",
+)
+# shared by every UnQLiteStorage: the collections all live in one database
+# file and serialize on it anyway, so a pool per instance only added
+# threads contending for the GIL and the handle
+
 
 class UnQLiteStorage(CommonStorage):
+    FIND_QUEUE_MAX = 64
+    # documents buffered loop-side per streaming scan; the worker thread
+    # blocks when the consumer lags instead of piling the result set in RAM
+
+    FIND_ONE_CACHE_LIMIT = 1024
+    FIND_ONE_CACHE_TTL = 5.0
+    # delivery looks the same mail or user up several times within a
+    # fraction of a second; a short-lived cache absorbs those repeats
+    # without letting a stale answer live long
+
     def __init__(self, instance: UnQLite, collection_name: str) -> None:
-        self.executor = ThreadPoolExecutor(
-            thread_name_prefix="mailboat.utils.storage.UnQLiteStorage.executor"
-        )
+        self.executor = _STORAGE_EXECUTOR
         self.instance = instance
         self.collection_name = collection_name
-        self.global_collection = self.new_collection
+        # one handle for the storage's lifetime; Collection() built a fresh
+        # wrapper object per access when this was a property
+        self.global_collection = self.instance.collection(collection_name)
         self.global_collection.create()
+        self._find_one_cache: "OrderedDict[frozenset, Tuple[Optional[Dict[str, Any]], float]]" = (
+            OrderedDict()
+        )
+        self._write_gen = 0
         super().__init__()
 
-    @property
-    def new_collection(self):
-        return self.instance.collection(self.collection_name)
+    def _run_jx9(self, source: str, bindings: Dict[str, Any]) -> Any:
+        """Execute a Jx9 program against this collection and return ``$res``.
+
+        A VM is built and compiled per execution on purpose: a reused VM
+        keeps answering from the snapshot its first run observed
+        (re-executing after reset() does not see later writes), so caching
+        compiled VMs froze every find at the first query's result.
+        """
+        with self.instance.vm(source) as vm:
+            vm["coll"] = self.collection_name
+            for name, value in bindings.items():
+                vm[name] = value
+            vm.execute()
+            return vm["res"]
+
+    def _invalidate_queries(self) -> None:
+        self._write_gen += 1
+        self._find_one_cache.clear()
+
+    def _on_write_done(self, _fut: "asyncio.Future") -> None:
+        self._invalidate_queries()
+
+    def _writethrough(self, fut: "asyncio.Future") -> "asyncio.Future":
+        # invalidate twice: at dispatch so later lookups miss, and at
+        # completion so an overlapping lookup that read pre-write state is
+        # rejected by the generation check in find_one
+        self._invalidate_queries()
+        fut.add_done_callback(self._on_write_done)
+        return fut
 
     def store_sync(self, record: Dict[str, Any]) -> Dict[str, Any]:
         self.global_collection.store(record)
         return record
 
     def store(self, record: Dict[str, Any]) -> Awaitable[Dict[str, Any]]:
-        return asyncio.get_running_loop().run_in_executor(
-            self.executor, self.store_sync, record
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, self.store_sync, record
+            )
+        )
+
+    def store_many_sync(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for record in records:
+            self.global_collection.store(record)
+        return records
+
+    def store_many(
+        self, records: List[Dict[str, Any]]
+    ) -> Awaitable[List[Dict[str, Any]]]:
+        # the whole batch goes to the worker in one hop instead of one
+        # executor round-trip per record
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, self.store_many_sync, records
+            )
         )
 
     @classmethod
     def doc_match(cls, doc: Dict[str, Any], match: Dict[str, Any]) -> bool:
-        for k in match:
-            if k in doc:
-                if match[k] == doc[k]:
-                    return True
-        return False
-
-    def _find(
-        self, query: Dict[str, Any], queue: asyncio.Queue[Optional[Dict[str, Any]]]
+        # every key must match (AND); the old code answered True on the
+        # first matching key, turning multi-key queries into OR
+        return all(k in doc and doc[k] == match[k] for k in match)
+
+    def _find_filtered(
+        self,
+        predicate: Callable[[Dict[str, Any]], bool],
+        queue: "asyncio.Queue[Dict[str, Any]]",
+        loop: asyncio.AbstractEventLoop,
+        closed: threading.Event,
     ) -> None:
-        for doc in self.new_collection.filter(lambda d: self.doc_match(d, query)):
-            queue.put_nowait(doc)
-        queue.put(None)
-
-    async def find(self, query: Dict[str, Any]) -> AsyncIterable[Dict[str, Any]]:
-        queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
-        fut = asyncio.ensure_future(
-            asyncio.get_running_loop().run_in_executor(
-                self.executor, self._find, query, queue
-            )
+        # run_coroutine_threadsafe + result() blocks this worker when the
+        # bounded queue is full (backpressure); completion travels out of
+        # band through the executor future, so no in-band sentinel value
+        # can ever collide with a document
+        for doc in self.global_collection.filter(predicate):
+            if closed.is_set():
+                return
+            asyncio.run_coroutine_threadsafe(queue.put(doc), loop).result()
+
+    async def _iter_filtered(
+        self, predicate: Callable[[Dict[str, Any]], bool]
+    ) -> AsyncIterable[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(
+            maxsize=self.FIND_QUEUE_MAX
+        )
+        closed = threading.Event()
+        fut = loop.run_in_executor(
+            self.executor, self._find_filtered, predicate, queue, loop, closed
         )
         try:
-            while el := (await queue.get()):
-                yield el
+            while True:
+                if queue.empty() and fut.done():
+                    break
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, fut}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            # an exception from the worker thread surfaces here instead of
+            # being swallowed with the iteration ending early
+            await fut
         finally:
-            if not fut.done():
-                fut.cancel()
+            # unblock a producer stuck on a full queue if the consumer left
+            closed.set()
+            while not queue.empty():
+                queue.get_nowait()
+
+    _JX9_FETCH_MATCHING = (
+        "$res = db_fetch_all($coll, function($rec) { return %s; });"
+    )
+
+    def _fetch_matching_sync(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not query:
+            return self.global_collection.all()
+        if not all(isinstance(k, str) and k.isidentifier() for k in query):
+            # keys that are not plain Jx9 identifiers go through the slow
+            # Python-callback filter
+            return self.global_collection.filter(lambda d: self.doc_match(d, query))
+        condition = " && ".join(f"$rec.{k} == $q{i}" for i, k in enumerate(query))
+        return (
+            self._run_jx9(
+                self._JX9_FETCH_MATCHING % condition,
+                {f"q{i}": value for i, value in enumerate(query.values())},
+            )
+            or []
+        )
+
+    async def find(self, query: Dict[str, Any]) -> AsyncIterable[Dict[str, Any]]:
+        # equality queries run inside UnQLite's Jx9 engine: one native scan
+        # instead of a Python callback (and GIL bounce) per document
+        docs = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._fetch_matching_sync, query
+        )
+        for doc in docs:
+            yield doc
+
+    async def find_by_prefix(
+        self, field: str, prefix: str
+    ) -> AsyncIterable[Dict[str, Any]]:
+        # the filter runs on the worker thread, so unmatched documents never
+        # cross the queue back to the event loop
+        async for doc in self._iter_filtered(
+            lambda d: isinstance(d.get(field), str) and d[field].startswith(prefix)
+        ):
+            yield doc
+
+    _JX9_FETCH_FIRST = (
+        "$res = NULL;\n"
+        "db_reset_record_cursor($coll);\n"
+        "while (($rec = db_fetch($coll)) != NULL) {\n"
+        "    if (%s) { $res = $rec; break; }\n"
+        "}"
+    )
+
+    def _find_one_sync(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not all(isinstance(k, str) and k.isidentifier() for k in query):
+            for doc in self.global_collection.filter(
+                lambda d: self.doc_match(d, query)
+            ):
+                return doc
+            return None
+        condition = (
+            " && ".join(f"$rec.{k} == $q{i}" for i, k in enumerate(query)) or "true"
+        )
+        return self._run_jx9(
+            self._JX9_FETCH_FIRST % condition,
+            {f"q{i}": value for i, value in enumerate(query.values())},
+        )
 
     async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        async for doc in self.find(query):
-            return doc
-        return None
+        # the cursor scan stops at the first hit instead of fetching every
+        # match like find() does
+        try:
+            key: Optional[frozenset] = frozenset(query.items())
+        except TypeError:
+            # unhashable query values cannot be cached; just do the scan
+            key = None
+        if key is not None:
+            entry = self._find_one_cache.get(key)
+            if entry is not None:
+                doc, stamp = entry
+                if monotonic() - stamp < self.FIND_ONE_CACHE_TTL:
+                    self._find_one_cache.move_to_end(key)
+                    # hand out a copy so a caller mutating the document
+                    # cannot poison later hits
+                    return dict(doc) if doc is not None else None
+                del self._find_one_cache[key]
+        gen = self._write_gen
+        doc = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._find_one_sync, query
+        )
+        if key is not None and gen == self._write_gen:
+            self._find_one_cache[key] = (doc, monotonic())
+            if len(self._find_one_cache) > self.FIND_ONE_CACHE_LIMIT:
+                self._find_one_cache.popitem(last=False)
+        return doc
+
+    def _exists_sync(self, query: Dict[str, Any]) -> bool:
+        for _doc in self.global_collection.filter(lambda d: self.doc_match(d, query)):
+            return True
+        return False
 
-    async def update_one(
-        self, query: Dict[str, Any], updated: Dict[str, Any], upsert: bool = False
+    def exists(self, query: Dict[str, Any]) -> Awaitable[bool]:
+        # only a bool crosses the thread boundary; no document is shipped to
+        # the loop just to be truth-tested
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, self._exists_sync, query
+        )
+
+    def _update_one_sync(
+        self, query: Dict[str, Any], updated: Dict[str, Any], upsert: bool
     ) -> Optional[Dict[str, Any]]:
-        doc = await self.find_one(query)
-        if doc:
-            doc_id = doc["__id"]
-            self.global_collection.update(doc_id, updated)
-        elif upsert:
-            await self.store(updated)
-            return updated
-        return None
+        # lookup and write happen on the same worker hop inside one
+        # transaction, so no other writer can slip between them
+        with self.instance.transaction():
+            doc = self._find_one_sync(query)
+            if doc:
+                self.global_collection.update(doc["__id"], updated)
+                return None
+            if upsert:
+                self.global_collection.store(updated)
+                return updated
+            return None
 
-    async def remove(self, query: Dict[str, Any]) -> int:
-        doc_ids: List[int] = []
-        async for doc in self.find(query):
-            doc_ids.append(doc["__id"])
-        for i in doc_ids:
-            self.global_collection.delete(i)
-        return len(doc_ids)
+    def update_one(
+        self, query: Dict[str, Any], updated: Dict[str, Any], upsert: bool = False
+    ) -> Awaitable[Optional[Dict[str, Any]]]:
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, self._update_one_sync, query, updated, upsert
+            )
+        )
 
-    async def remove_one(self, query: Dict[str, Any]) -> bool:
-        doc = await self.find_one(query)
-        if doc:
-            self.global_collection.delete(doc["__id"])
-            return True
-        else:
+    def _remove_sync(self, query: Dict[str, Any]) -> int:
+        # one commit for the whole batch instead of a write per delete
+        with self.instance.transaction():
+            docs = self._fetch_matching_sync(query)
+            for doc in docs:
+                self.global_collection.delete(doc["__id"])
+            return len(docs)
+
+    def remove(self, query: Dict[str, Any]) -> Awaitable[int]:
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, self._remove_sync, query
+            )
+        )
+
+    def _remove_one_sync(self, query: Dict[str, Any]) -> bool:
+        with self.instance.transaction():
+            doc = self._find_one_sync(query)
+            if doc:
+                self.global_collection.delete(doc["__id"])
+                return True
             return False
+
+    def remove_one(self, query: Dict[str, Any]) -> Awaitable[bool]:
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor, self._remove_one_sync, query
+            )
+        )
+
+    def incr_field_sync(
+        self,
+        query: Dict[str, Any],
+        field: str,
+        delta: int,
+        default: Optional[Callable[[], Dict[str, Any]]] = None,
+        remove_on_zero: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        with self.instance.transaction():
+            for doc in self.global_collection.filter(
+                lambda d: self.doc_match(d, query)
+            ):
+                doc[field] = doc[field] + delta
+                if remove_on_zero and doc[field] <= 0:
+                    self.global_collection.delete(doc["__id"])
+                else:
+                    self.global_collection.update(doc["__id"], doc)
+                return doc
+            if default is not None:
+                new_doc = default()
+                self.global_collection.store(new_doc)
+                return new_doc
+            return None
+
+    def incr_field(
+        self,
+        query: Dict[str, Any],
+        field: str,
+        delta: int,
+        default: Optional[Callable[[], Dict[str, Any]]] = None,
+        remove_on_zero: bool = False,
+    ) -> Awaitable[Optional[Dict[str, Any]]]:
+        """Add `delta` to `field` of the first document matching `query` in one
+        transaction. When no document matches, the document built by `default` is
+        stored instead if given; `default` is only called on that path, so callers
+        can defer expensive document building to the true-insert case.
+        When `remove_on_zero` is set, a document whose counter drops to zero or
+        below is removed instead of updated.
+        """
+        return self._writethrough(
+            asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                lambda: self.incr_field_sync(
+                    query, field, delta, default, remove_on_zero
+                ),
+            )
+        )
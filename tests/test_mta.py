@@ -29,10 +29,12 @@ class TestTransferAgent:
     @pytest.mark.asyncio
     async def test_local_delivery_in_unqlite_memory_queue(self, unused_tcp_port: int):
         virtual_box = []
+        box_filled = asyncio.Event()
         database = UnQLite(":mem:")
 
         async def delivery_handler(email: EmailMessage):
             virtual_box.append(email)
+            box_filled.set()
 
         ta = TransferAgent(
             mydomains=["localhost"],
@@ -53,11 +55,7 @@ class TestTransferAgent:
                         email, hostname="localhost", port=unused_tcp_port
                     )
 
-            async def wait_virtual_box():
-                while len(virtual_box) < 1:
-                    await asyncio.sleep(0)
-
-            await asyncio.wait_for(wait_virtual_box(), 1)
+            await asyncio.wait_for(box_filled.wait(), 1)
             assert isinstance(virtual_box[0], EmailMessage)
             message = virtual_box[0]
             assert message['message-id'] == '<test1@localhost>'
@@ -6,9 +6,6 @@ from mailboat.mta import MemoryEmailQueue
 
 class TestMemoryEmailQueue:
     @pytest.mark.asyncio
-    @pytest.mark.skip(
-        "rubicon: this test's task is always in pending and the eventloop stuck at I/O selector under cpython 3.9.2"
-    )
     async def test_method_get_should_return_different_entities_across_calls(self):
         queue = MemoryEmailQueue()
         email0 = EmailMessage()
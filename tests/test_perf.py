@@ -14,7 +14,7 @@
 # 
 # You should have received a copy of the GNU General Public License
 # along with Mailboat.  If not, see <http://www.gnu.org/licenses/>.
-from typing import List
+from collections import deque
 from uuid import uuid4
 import pytest
 from mailboat.utils.perf import PERF_DATA, PERF_DATA_NUMBER_LIMIT, perf_point, async_perf_point
@@ -28,7 +28,7 @@ class TestPerfUtils:
             pass
 
         assert test_str in PERF_DATA
-        assert isinstance(PERF_DATA[test_str], List)
+        assert isinstance(PERF_DATA[test_str], deque)
     
     def test_perf_point_can_record_perf_cell(self):
         test_str = str(uuid4())
@@ -38,12 +38,12 @@ class TestPerfUtils:
             pass
         
         spam()
-        assert isinstance(PERF_DATA[test_str], List)
+        assert isinstance(PERF_DATA[test_str], deque)
         assert len(PERF_DATA[test_str]) == 1
         cell = PERF_DATA[test_str][0]
         assert cell.name == test_str
-        assert isinstance(cell.t1, float)
-        assert isinstance(cell.t2, float)
+        assert isinstance(cell.ns, int)
+        assert isinstance(cell.processing_time(), float)
     
     def test_perf_point_can_keep_list_length_in_limit(self):
         test_str = str(uuid4())
@@ -66,7 +66,7 @@ class TestPerfUtils:
             pass
 
         assert test_str in PERF_DATA
-        assert isinstance(PERF_DATA[test_str], List)
+        assert isinstance(PERF_DATA[test_str], deque)
     
     @pytest.mark.asyncio
     async def test_async_perf_point_can_record_perf_cell(self):
@@ -77,12 +77,12 @@ class TestPerfUtils:
             pass
         
         await spam()
-        assert isinstance(PERF_DATA[test_str], List)
+        assert isinstance(PERF_DATA[test_str], deque)
         assert len(PERF_DATA[test_str]) == 1
         cell = PERF_DATA[test_str][0]
         assert cell.name == test_str
-        assert isinstance(cell.t1, float)
-        assert isinstance(cell.t2, float)
+        assert isinstance(cell.ns, int)
+        assert isinstance(cell.processing_time(), float)
     
     @pytest.mark.asyncio
     async def test_async_perf_point_can_keep_list_length_in_limit(self):
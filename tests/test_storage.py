@@ -0,0 +1,42 @@
+import pytest
+from unqlite import UnQLite
+
+from mailboat.utils.storage import UnQLiteStorage
+
+
+class TestUnQLiteStorage:
+    @pytest.mark.asyncio
+    async def test_find_one_sees_writes_after_earlier_queries(self):
+        # regression: a cached Jx9 VM answered every later query from the
+        # snapshot its first execution observed, so documents stored or
+        # updated after the first lookup were unfindable
+        storage = UnQLiteStorage(UnQLite(":mem:"), "test_storage")
+        await storage.store({"username": "alice", "generation": 1})
+
+        found = await storage.find_one({"username": "alice"})
+        assert found is not None
+        assert found["generation"] == 1
+
+        await storage.store({"username": "bob", "generation": 1})
+        found = await storage.find_one({"username": "bob"})
+        assert found is not None
+        assert found["generation"] == 1
+
+        await storage.update_one(
+            {"username": "alice"}, {"username": "alice", "generation": 2}
+        )
+        found = await storage.find_one({"username": "alice"})
+        assert found is not None
+        assert found["generation"] == 2
+
+    @pytest.mark.asyncio
+    async def test_find_sees_writes_after_earlier_queries(self):
+        storage = UnQLiteStorage(UnQLite(":mem:"), "test_storage")
+        await storage.store({"kind": "a"})
+        assert len([doc async for doc in storage.find({"kind": "a"})]) == 1
+
+        await storage.store({"kind": "a"})
+        assert len([doc async for doc in storage.find({"kind": "a"})]) == 2
+
+        await storage.remove({"kind": "a"})
+        assert len([doc async for doc in storage.find({"kind": "a"})]) == 0
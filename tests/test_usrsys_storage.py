@@ -0,0 +1,33 @@
+import pytest
+from unqlite import UnQLite
+
+from mailboat.usrsys.storage import UserRecordStorage
+from mailboat.usrsys.usr import UserRecord
+from mailboat.utils.asec import password_hashing
+from mailboat.utils.storage import UnQLiteStorage
+
+
+class TestUserRecordStorage:
+    @pytest.mark.asyncio
+    async def test_check_user_password_caches_both_outcomes(self):
+        storage = UserRecordStorage(UnQLiteStorage(UnQLite(":mem:"), "users"))
+        await storage.store(
+            UserRecord(
+                nickname="Alice",
+                username="alice",
+                password_b64hash=await password_hashing(b"secret"),
+                profileid="profile0",
+                mailbox_id="mailbox0",
+            )
+        )
+        assert await storage.check_user_password("alice", b"secret") is True
+        # regression: a mismatch used to raise InvalidkeyError out of the
+        # auth path, so a False outcome never reached the cache
+        assert await storage.check_user_password("alice", b"wrong") is False
+        assert len(storage._password_cache) == 2
+        assert await storage.check_user_password("alice", b"wrong") is False
+
+    @pytest.mark.asyncio
+    async def test_check_user_password_unknown_user_returns_false(self):
+        storage = UserRecordStorage(UnQLiteStorage(UnQLite(":mem:"), "users"))
+        assert await storage.check_user_password("nosuchuser", b"whatever") is False